@@ -1,108 +1,203 @@
-def data_mapping(self, source_data_df: DataFrame, mapping_metadata: dict) -> None:
+def data_mapping(self, source_data_df: DataFrame, mapping_metadata: dict) -> list[dict]:
 
         id_column = mapping_metadata.get("id_column")
-        persisted_df = self._persist_data(source_data_df, id_column)
+        persisted_df = self._persist_data(source_data_df,
+                                          id_column,
+                                          key=mapping_metadata.get("id_key"),
+                                          hash_bits=mapping_metadata.get("id_hash_bits", 128),
+                                          collision_report=mapping_metadata.get("id_collision_report", False))
+
+        return self._output_mapped_data(prepared_df=persisted_df, metadata=mapping_metadata)
+
+def _persist_data(self, source_data_df: DataFrame, id_column: str, key=None, hash_bits: int = 128, collision_report: bool = False) -> DataFrame:
+    """Adds an identifier hashed from a key to each row, so reruns over the same data reproduce the identifiers.
+    A 128 bit identifier is formatted as a GUID (8-4-4-4-12 hex digits), a 64 bit one as 16 hex digits.
+
+    Args:
+        source_data_df (DataFrame): Data to add the identifier to.
+        id_column (str): Name of the identifier column.
+        key (list[str] | str, optional): Column, or columns, hashed into the identifier. "source_row" uses the
+                                         source_filepath and row_id columns added by validate_files. Default is every
+                                         column except id_column and row_id.
+        hash_bits (int, optional): Width of the identifier, 64 or 128 bits. Default is 128.
+        collision_report (bool, optional): Count duplicate identifiers with one aggregation and record them in
+                                           row_id_report, split into duplicate keys and hash collisions. Default is False.
+
+    Returns:
+        source_data_df (DataFrame): The data with the id_column added.
+    """
+    if hash_bits not in (64, 128):
+        raise ValueError(f"hash_bits must be 64 or 128, received {hash_bits}")
+
+    if key == "source_row":
+        if SOURCE_FILE_COLUMN not in source_data_df.columns:
+            raise ValueError(f"key='source_row' needs the {SOURCE_FILE_COLUMN} and row_id columns added by validate_files")
+        # Remove the "<file_index>:" prefix of the batch, which changes with the files in the batch
+        key_columns = [F.col(SOURCE_FILE_COLUMN), F.expr("substr(row_id, instr(row_id, ':') + 1)")]
+    elif key:
+        key_columns = [F.col(column) for column in ([key] if isinstance(key, str) else key)]
+    else:
+        key_columns = [F.col(column) for column in source_data_df.columns if column not in [id_column, "row_id"]]
+    hash_inputs = [value for column in key_columns for value in (column.isNull(), column)]
+
+    # Each 64 bit hash is salted with its position so the two halves of a 128 bit identifier are independent
+    id_parts = [F.lpad(F.hex(F.xxhash64(F.lit(part), *hash_inputs)), 16, "0") for part in range(hash_bits // 64)]
+    row_identifier = F.lower(F.concat(*id_parts))
+    if hash_bits == 128:
+        row_identifier = F.regexp_replace(row_identifier, "^(.{8})(.{4})(.{4})(.{4})(.{12})$", "$1-$2-$3-$4-$5")
+    source_data_df = source_data_df.withColumn(id_column, row_identifier)
+
+    if collision_report:
+        report = (
+            source_data_df
+            .groupBy(id_column)
+            .agg(F.count(F.lit(1)).alias("rows"), F.countDistinct(F.to_json(F.struct(*key_columns))).alias("keys"))
+            .where(F.col("rows") > 1)
+            .agg(F.count(F.lit(1)).alias("duplicate_ids"),
+                 F.sum("rows").alias("duplicate_rows"),
+                 F.count(F.when(F.col("keys") > 1, True)).alias("collisions"))
+            .first()
+        )
+        self._row_id_report = {"id_column": id_column, "hash_bits": hash_bits, "duplicate_ids": report["duplicate_ids"],
+                               "duplicate_rows": report["duplicate_rows"] or 0, "collisions": report["collisions"]}
+        if report["collisions"] and self._logger:
+            self._logger.warning(f"{report['collisions']} hash collisions in {id_column}, use a wider hash_bits or key")
+
+    return source_data_df
+
+def _output_mapped_data(self, prepared_df: DataFrame, metadata: dict) -> list[dict]:
+    """Maps the prepared dataframe to the output tables as defined in the metadata and writes them.
+    The prepared data is persisted once and every table is written from it, several at a time, and it is
+    released when the writes finish. Each table is written as the number of files implied by its size estimate
+    and target_file_bytes, rather than through one task. The rows of each table are counted by the write itself
+    with an Observation, and the files of a table with no rows are removed, so no separate isEmpty job runs.
+    Empty Delta writes only add an empty commit.
+
+    The output settings are read from the optional "output" dictionary of the metadata:
+        format (str): csv, written with a header, parquet or delta. Default is csv.
+        path (str): Folder the tables are written to. Default is Files/<FEED_NAME>/staging/<PIPELINE_RUN_ID>/output.
+        mode (str): Write mode. Default is errorifexists.
+        target_file_bytes (int): Approximate size of each output file. Default is 128 MiB.
+        max_records_per_file (int): Maximum number of rows in each file. Default is no limit.
+        max_parallel_writes (int): Number of tables written at the same time. Default is 4.
+
+    Returns:
+        write_results (list[dict]): The table, path, format, rows and status (written, empty or skipped) of each table.
+    """
+    table_mapping = metadata.get("tables")
+    output_options = metadata.get("output", {})
+    output_path = output_options.get("path") or f"Files/{FEED_NAME}/staging/{PIPELINE_RUN_ID}/output"
 
-        self._output_mapped_data(prepared_df=persisted_df, metadata=mapping_metadata)
+    # Compute the prepared data once, before the writes read it concurrently, and release it once they finish
+    persist_prepared = len(table_mapping) > 1 and not prepared_df.is_cached
+    if persist_prepared:
+        prepared_df = prepared_df.persist(StorageLevel.MEMORY_AND_DISK)
+        prepared_df.count()
 
-        return
+    try:
+        output_dfs = {table.get("name"): self._map_output_table(prepared_df, table) for table in table_mapping}
 
-def _persist_data(self, source_data_df: DataFrame, id_column: str) -> DataFrame:
-    """Generates a unique row identifier for each row in the dataframe based on a hash of all columns except the id_column.
-    The function creates a hash of all columns except the id_column to identify unique rows. It then generates a UUID for each unique row and joins this back to the original dataframe.
-    The resulting dataframe contains a new column 'row_id' with the unique identifier for each row."""
-    # create hash on all columns except id_column
-    hash_columns = [col for col in source_data_df.columns if col != id_column]
-    source_data_df = source_data_df.withColumn("row_hash", F.sha2(F.concat_ws("||", *[F.col(c).cast("string") for c in hash_columns]), 256))
+        with ThreadPoolExecutor(max_workers=output_options.get("max_parallel_writes", 4), thread_name_prefix="data-quality-write") as executor:
+            futures = [executor.submit(self._write_output_table, output_df, table_name, f"{output_path}/{table_name}", output_options)
+                       for table_name, output_df in output_dfs.items()]
+            write_results = [future.result() for future in futures]
+    finally:
+        if persist_prepared:
+            prepared_df.unpersist()
 
-    ids_df = (
-        source_data_df
-        .select("row_hash")
-        .withColumn(id_column, F.expr("uuid()"))
-    )
+    return write_results
 
-    # Persist only the small dataframe with the id column and the hash to optimize performance
-    ids_df.persist()
+def _map_output_table(self, prepared_df: DataFrame, table: dict) -> DataFrame:
+    """Selects, derives and filters the columns of one output table from the prepared dataframe."""
+    all_columns = table.get("columns", None)
 
-    # join ids_df back on source_data_df on the row_hash column
-    joined_df = source_data_df.join(ids_df.select(id_column, "row_hash", "row_id"), on=["row_hash"], how="inner").drop("row_hash")
+    # Convert column mapping ot PySpark select expression
+    source_to_target_columns = [column for column in all_columns if "source" in column]
+    output_columns = [F.col(column["source"]).alias(column["target"]) for column in source_to_target_columns]
 
+    # Get derived column names and fixed values
+    derived_columns = [column for column in all_columns if "value" in column]
 
-    return joined_df
+    # Convert columns to a dictionary to filter duplicates
+    column_dict = {str(column): column for column in output_columns}
 
-def _output_mapped_data(self, prepared_df: DataFrame, metadata: dict) -> None:
-    """Maps the prepared dataframe to the output tables as defined in the metadata and writes them to CSV."""
-    # Get all tables which should be written
-    table_mapping = metadata.get("tables")
+    # Convert columns back to list
+    output_columns = list(column_dict.values())
 
-    # Filter the list to get only which have been processed as a part of the data mapping
-    table_names = [table.get("name") for table in table_mapping]
-
-    for table_name in table_names:
-        # Get source to target column mapping
-        current_table = [table for table in table_mapping if table.get("name", None) == table_name][0]
-        all_columns = current_table.get("columns", None)
-        
-        # Convert column mapping ot PySpark select expression
-        source_to_target_columns = [column for column in all_columns if "source" in column]
-        output_columns = [F.col(column["source"]).alias(column["target"]) for column in source_to_target_columns]
-
-                    # Get derived column names and fixed values
-        derived_columns = [column for column in all_columns if "value" in column]
-
-        # Convert columns to a dictionary to filter duplicates
-        column_dict = {str(column): column for column in output_columns}
-        
-        # Convert columns back to list
-        output_columns = list(column_dict.values())
-
-        output_df = prepared_df.select(*output_columns)
-        
-        # Add derived columns with fixed values
-        for column in derived_columns:
-            column_value = column["value"]
-            target_column_name = column["target"]
-
-            output_df = output_df.withColumn(target_column_name, F.lit(column_value))
-        
-        behaviour_filters = [{"target": column["target"], "match_type": column["behaviour"]["match_type"]} for column in all_columns if "behaviour" in column]
-
-        for filter in behaviour_filters:
-            filter_column = filter.get("target")
-            match_type = filter.get("match_type")
-
-            # If the value of the filter column is not equal to the match type then set it to null
-            #  so that it is not updated in SCRM
-            output_df = (
-                output_df.withColumn(
-                    filter_column,
-                    F.when(
-                        F.col("match_type") == match_type, F.col(filter_column)
-                    ).otherwise(F.lit(None))
-                )
-            )
-        
-        conditions = current_table.get("conditions", [])
-        
-        for condition in conditions:
-            condition_col = condition.get("column", None)
-            comparison = condition.get("comparison", None)
-            conditional_value = condition.get("value", None)
-
-            if comparison == "eq":
-                output_df = output_df.where(F.col(condition_col) == conditional_value)
-        
-        if not output_df.isEmpty():
-            print(f"Writing output for {table_name}")
-
-            (
-                output_df
-                .drop("match_type")
-                .coalesce(1)
-                .write
-                .option("header", "true")
-                .csv(f"Files/{FEED_NAME}/staging/{PIPELINE_RUN_ID}/output/{table_name}")
-            )
+    output_df = prepared_df.select(*output_columns)
 
+    # Add derived columns with fixed values
+    for column in derived_columns:
+        column_value = column["value"]
+        target_column_name = column["target"]
 
-    return
\ No newline at end of file
+        output_df = output_df.withColumn(target_column_name, F.lit(column_value))
+
+    behaviour_filters = [{"target": column["target"], "match_type": column["behaviour"]["match_type"]} for column in all_columns if "behaviour" in column]
+
+    for filter in behaviour_filters:
+        filter_column = filter.get("target")
+        match_type = filter.get("match_type")
+
+        # If the value of the filter column is not equal to the match type then set it to null
+        #  so that it is not updated in SCRM
+        output_df = (
+            output_df.withColumn(
+                filter_column,
+                F.when(
+                    F.col("match_type") == match_type, F.col(filter_column)
+                ).otherwise(F.lit(None))
+            )
+        )
+
+    conditions = table.get("conditions", [])
+
+    for condition in conditions:
+        condition_col = condition.get("column", None)
+        comparison = condition.get("comparison", None)
+        conditional_value = condition.get("value", None)
+
+        if comparison == "eq":
+            output_df = output_df.where(F.col(condition_col) == conditional_value)
+
+    return output_df.drop("match_type")
+
+def _write_output_table(self, output_df: DataFrame, table_name: str, path: str, output_options: dict) -> dict:
+    """Writes one output table in files of about target_file_bytes and returns the rows counted by the write.
+    When a csv or parquet write has no rows only the files it added are removed, so data already in the folder
+    from an earlier append is kept. With mode ignore a table whose folder exists is skipped without a write."""
+    output_format = output_options.get("format", "csv")
+    mode = output_options.get("mode", "errorifexists")
+    hadoop_path = self._spark._jvm.org.apache.hadoop.fs.Path(path)
+    file_system = hadoop_path.getFileSystem(self._spark._jsc.hadoopConfiguration())
+    existing_files = None
+    if file_system.exists(hadoop_path):
+        existing_files = {status.getPath().toString() for status in file_system.listStatus(hadoop_path)}
+    if mode == "ignore" and existing_files is not None:
+        return {"table": table_name, "path": path, "format": output_format, "rows": None, "status": "skipped"}
+
+    size_estimate = self._materialisation_policy.estimate_size_bytes(output_df)
+    if size_estimate:
+        output_df = output_df.coalesce(max(1, -(-size_estimate // output_options.get("target_file_bytes", 128 * 1024 ** 2))))
+
+    observation = Observation(f"{table_name}_{uuid.uuid4().hex}")
+    writer = output_df.observe(observation, F.count(F.lit(1)).alias("rows")).write.format(output_format).mode(mode)
+    if output_format == "csv":
+        writer = writer.option("header", "true")
+    if output_options.get("max_records_per_file"):
+        writer = writer.option("maxRecordsPerFile", output_options["max_records_per_file"])
+
+    if self._logger:
+        self._logger.info(f"Writing output for {table_name}")
+    writer.save(path)
+    rows = observation.get["rows"]
+
+    if rows == 0 and output_format != "delta":
+        if existing_files is None:
+            file_system.delete(hadoop_path, True)
+        else:
+            for status in file_system.listStatus(hadoop_path):
+                if status.getPath().toString() not in existing_files:
+                    file_system.delete(status.getPath(), True)
+
+    return {"table": table_name, "path": path, "format": output_format, "rows": rows, "status": "written" if rows else "empty"}
@@ -1,16 +1,21 @@
-    def _match_to_optionset(self, source_data_df: DataFrame, entity_name: str, optionset_name: str, source_column: str, output_column: str, custom_error: str, behaviour: str, rule_name:str) -> DataFrame:
+    def _match_to_optionset(self, source_data_df: DataFrame, entity_name: str, optionset_name: str, source_column: str | list[str], output_column: str | list[str], custom_error: str, behaviour: str, rule_name:str) -> DataFrame:
         """Gets the optionset value for a corresponding label.
         Queries the Dynamics OptionSetMetadata entity to retrieve the value and 
         lable columns for a specified entity. These are then compared to the supplied
         source column in the dataframe, and a new column is created containing the 
         option set values for use in the matching process.
 
+        The options are turned into a map literal keyed on the lowercased label, so the
+        lookup runs inside the JVM as a hash lookup shipped with the task instead of a Python
+        UDF. Several source columns can be resolved against the same optionset in one rule
+        and all of their failures are logged with a single action.
+
         Args:
             source_data_df (DataFrame): Spark dataframe containing source data.
             entity_name (str): Name of the Dynamics entity to reference.
             optionset_name (str): Name of the option set to reference.
-            source_column (str): Name of the column containing the value to search for.
-            output_column (str): Name of the new column to be created.
+            source_column (str | list[str]): Name of the column(s) containing the value to search for.
+            output_column (str | list[str]): Name of the new column(s) to be created, in the same order as source_column.
             custom_error (str): Optional custom error message from the rule metadata.
             behaviour (str): Action to take if the match fails, e.g. fail_row or return_null
             rule_name (str): Name of the metadata rule that called this function
@@ -24,48 +29,58 @@
         else:
             behaviour = 'fail_row'
 
+        source_columns = [source_column] if isinstance(source_column, str) else source_column
+        output_columns = [output_column] if isinstance(output_column, str) else output_column
+
         validation = "Match to Optionset"
         # Query the GlobalOptionSetMetadata table for the supplied optionset
-        optionset_df = (
-            spark
-            .table(f"{self.environment}_GlobalOptionSetMetadata")
-            .where(f"EntityName = '{entity_name}' AND OptionSetName = '{optionset_name}'")
-        )
-
-        optionset_data = {row.Option : row.LocalizedLabel for row in optionset_df.collect()}
-        
-        # Spark UDF to map localizedlabel to optionsetvalue
-        def label_to_value(column_value):
-            """Spark UDF swaps the label for the optionset value."""
-            for key, value in optionset_data.items():
-                if value.lower() == column_value:
-                    return key
-
-
-            return None
-
-        # Register the UDF
-        label_to_value_udf = F.udf(label_to_value, StringType())
-
-        # Create output column containing optionset values for the column values
-        source_data_df = source_data_df.withColumn(output_column, label_to_value_udf(F.lower(F.col(source_column))))
-
-        # Only retrieve matches for rows in which the source column contains a value    
-        no_match_df = source_data_df.where((F.col(output_column).isNull()) & (F.col(source_column).isNotNull()))
-
-        if not no_match_df.isEmpty():
-            if behaviour == "fail_row":
-                
-                for row in no_match_df.collect():
-                    standard_error = f"The value in '{source_column}' does not match an option in the optionset '{optionset_name}' in entity '{entity_name}'."
-                    error_message = custom_error if custom_error else standard_error
-
-                    self._log_failed_rows(no_match_df, validation, rule_name, "row processing", error_message)
-            elif behaviour == "return_null":
-                source_data_df = source_data_df.withColumn(output_column, F.lit(None))
+        optionset_df = self._get_lookup_table(f"{self.environment}_GlobalOptionSetMetadata",
+                                              columns=["Option", "LocalizedLabel"],
+                                              filter_condition=f"EntityName = '{entity_name}' AND OptionSetName = '{optionset_name}'")
+
+        # Build a map of lowercased label to optionset value, keeping the first option for a repeated label
+        optionset_data = {}
+        for row in self._collect(optionset_df.where(F.col("LocalizedLabel").isNotNull())):
+            optionset_data.setdefault(row.LocalizedLabel.lower(), str(row.Option))
+
+        label_to_value = F.create_map(*[F.lit(item) for pair in optionset_data.items() for item in pair]) if optionset_data else None
+
+        # Create output columns containing optionset values for the column values
+        error_structs = []
+        for index, (column, output) in enumerate(zip(source_columns, output_columns)):
+            if label_to_value is not None:
+                source_data_df = source_data_df.withColumn(output, label_to_value[F.lower(F.col(column))])
             else:
-                if self.verbose_logging:
-                    self.logger.warning(f"Received unexpected behaviour {behaviour}")
+                source_data_df = source_data_df.withColumn(output, F.lit(None).cast(StringType()))
+
+            standard_error = f"The value in '{column}' does not match an option in the optionset '{optionset_name}' in entity '{entity_name}'."
+            error_message = custom_error if custom_error else standard_error
+
+            # Only rows in which the source column contains a value are errors
+            error_structs.append(F.when(
+                (F.col(output).isNull()) & (F.col(column).isNotNull()),
+                F.struct(
+                    F.lit(index).alias("check_index"),
+                    F.lit(rule_name).alias("rule_name"),
+                    F.lit(validation).alias("validation"),
+                    F.lit(error_message).alias("error_message")
+                )
+            ))
+
+        if behaviour == "fail_row":
+            failed_rows_df = (
+                source_data_df
+                .select("datasource", "entity_name", "row_id",
+                        F.filter(F.array(*error_structs), lambda error: error.isNotNull()).alias("errors"))
+                .where(F.size("errors") > 0)
+                .select("datasource", "entity_name", "row_id", F.explode("errors").alias("error"))
+                .select("datasource", "entity_name", "row_id", "error.*")
+            )
+            self._log_compiled_errors(failed_rows_df=failed_rows_df, validation_stage="row processing")
+        elif behaviour != "return_null":
+            # Unmatched labels are already null in the output columns for return_null
+            if self.verbose_logging:
+                self.logger.warning(f"Received unexpected behaviour {behaviour}")
 
 
         return source_data_df
@@ -96,68 +111,9 @@
             source_data_df (DataFrame): Tranformed dataframe with the additional column.
         """
         # Get error messages
-        no_match_entity_error = None
         no_match_entity_error = custom_error if custom_error else f"No matching record can be found in the {entity} table in the SCRM that match this row. Create a matching row and resubmit"
-        multiple_match_entity_error = None
         multiple_match_entity_error = custom_error if custom_error else f"Multiple matching records in {entity} were returned for this row. Fix the duplicated rows in the SCRM and resubmit."
 
-        # Create an expression to check if all the output columns are null
-        # This is checked to see if there is a match in SCRM
-        check_matched_columns = [F.col(col["column_name_in_scrm"]).isNull() for col in output_columns]
-        check_match_columns_expr = None
-        for expression in check_matched_columns:
-            if check_match_columns_expr is None:
-                check_match_columns_expr = expression
-            else:
-                check_match_columns_expr = check_match_columns_expr & expression
-
-        # Get the fully qualified table
-        entity_table = f"{self.environment}_{entity}"
-
-        # Build the join condition using either column or value
-        join_condition = None
-        for match in match_filters:
-            entity_col = match.get("filter_on")
-            source_col = match.get("filter_by_column")
-            static_val = match.get("filter_by_value")
-                        
-            if source_col:
-                # Create an expression to see if the input column is not null
-                # This is used to see if there is a match in SCRM
-                check_match_columns_expr = check_match_columns_expr & F.col(source_col).isNotNull()
-                
-                condition = f"LOWER(source_data_df.`{source_col}`) = LOWER(entity.{entity_col})"
-            else:
-                # Lower the static value if it is a string else leave it as is if it is another
-                #  data type such as an integer or float
-                expression = f"LOWER('{static_val}')" if isinstance(static_val, str) else f"{static_val}"
-                condition = f"LOWER(entity.{entity_col}) = {expression}"
-        
-            join_condition = join_condition + " AND " + condition if join_condition else condition
-
-        # Build the list of columns to select and their alias to be used in source_data_df 
-        select_columns = None
-        for output in output_columns:
-            output_column = output.get("column_name_in_scrm")
-            output_alias = output.get("output")
-
-            select_column = f"entity.{output_column} AS {output_alias}"
-
-            select_columns = select_columns + "," + select_column if select_columns else select_column
-
-        # Convert source_data_df to a view to allow joining with the entity table
-        source_data_df.createOrReplaceTempView("source_data_df")
-
-        # Build the query
-        sql_query = f"""
-            SELECT source_data_df.*, {select_columns}, entity.createdon
-            FROM source_data_df
-            LEFT JOIN {entity_table} AS entity
-            ON {join_condition}
-            """
-        # Execute the query, returning the source_data_df with the columns from entity as specified    
-        matched_df = self._spark.sql(sql_query)
-
         # Handle behaviours
         # Set defaults
         found_none_behaviour = None
@@ -176,83 +132,97 @@
         if found_multiple_behaviour is None or found_multiple_behaviour not in valid_found_multiple_behaviours:
             found_multiple_behaviour = "fail_row"
 
-        # Found none behaviour. 
-        # Since the join returns null in the columns if no match is found, 
-        # there is no additional action required for return null 
-        # Process fail_row behaviour. 
-        if found_none_behaviour == "fail_row":
+        # Get the fully qualified table, holding only the columns required by the match in the lookup cache
+        entity_table = f"{self.environment}_{entity}"
+        entity_columns = list(dict.fromkeys(
+            [match.get("filter_on") for match in match_filters]
+            + [output.get("column_name_in_scrm") for output in output_columns]
+            + ["createdon"]
+        ))
+        entity_df = self._get_lookup_table(entity_table, columns=entity_columns)
+
+        # Normalise the join keys once on each side. Static values filter the entity before the join.
+        source_key_columns = []
+        key_columns = []
+        for index, match in enumerate(match_filters):
+            entity_col = match.get("filter_on")
+            source_col = match.get("filter_by_column")
+            static_val = match.get("filter_by_value")
 
-            condition_expr = None
-            if conditions:
-                for condition in conditions:
-                    column = condition["column"]
-                    comparison = condition["comparison"]
-                    value = condition["value"]
-
-                    if comparison == "eq":
-                        expr = F.col(column) == value
-                    elif comparison == "ne":
-                        expr = ((F.col(column) != value) | (F.col(column).isNull()) )
-                    else:
-                        if self.verbose_logging:
-                            self.logger.warning(f"Unsupported comparison operator: {comparison} in {rule_name}")
-
-                    if condition_expr is None:
-                        condition_expr = expr
-                    else:
-                        condition_expr = condition_expr & expr
-            
-            # Only apply the condition if it contains a value other than None
-            if validate_null:
-                if condition_expr is not None:
-                    errors_df = matched_df.where(check_match_columns_expr & condition_expr)
-                else:
-                    errors_df = matched_df.where(check_match_columns_expr)
+            if source_col:
+                key_column = f"_match_key_{index}"
+                entity_df = entity_df.withColumn(key_column, F.lower(F.col(entity_col)))
+                source_data_df = source_data_df.withColumn(key_column, F.lower(F.col(source_col)))
+                source_key_columns.append(source_col)
+                key_columns.append(key_column)
             else:
-                if condition_expr is not None:
-                    errors_df = matched_df.where((check_match_columns_expr & F.col(source_col).isNotNull()) & condition_expr)
-                else:
-                    errors_df = matched_df.where(check_match_columns_expr & F.col(source_col).isNotNull())
-
-            errors_df = errors_df.withColumn("error_message", F.lit(no_match_entity_error))
-
-            self._log_failed_rows(errors_df, validation, rule_name, "matching")
+                # Lower the static value if it is a string else leave it as is if it is another
+                #  data type such as an integer or float
+                static_expr = F.lower(F.lit(static_val)) if isinstance(static_val, str) else F.lit(static_val)
+                entity_df = entity_df.where(F.lower(F.col(entity_col)) == static_expr)
+
+        # Resolve the found_multiple_behaviour on the entity side so the join returns one row per key.
+        # fail_row keeps the newest to prevent duplicates in onward processing, and the number of
+        # matches is kept to log the multiple match errors from the same pass.
+        order_by = F.col("createdon").asc() if found_multiple_behaviour in ["oldest", "any"] else F.col("createdon").desc()
+        key_window = W.partitionBy(*key_columns) if key_columns else W.partitionBy(F.lit(1))
+        entity_df = (
+            entity_df
+            .withColumn("_match_count", F.count(F.lit(1)).over(key_window))
+            .withColumn("_match_row_num", F.row_number().over(key_window.orderBy(order_by)))
+            .where(F.col("_match_row_num") == 1)
+            .select(*key_columns,
+                    *[F.col(output.get("column_name_in_scrm")).alias(output.get("output")) for output in output_columns],
+                    "_match_count")
+        )
+        entity_df = self._broadcast_if_small(entity_df)
 
-        duplicates_df = matched_df.groupBy("row_id").count().where(F.col("count") > 1)
-    
-        if duplicates_df.count() > 0:
-            if found_multiple_behaviour == "oldest" or found_multiple_behaviour == "any":
-                matched_df = (
-                    matched_df
-                    .withColumn("row_num", F.row_number().over(
-                        W.partitionBy("row_id").orderBy(F.col("createdon").asc())
-                    ))
-                )
-            elif found_multiple_behaviour == "newest":
-                matched_df = (
-                    matched_df
-                    .withColumn("row_num", F.row_number().over(
-                        W.partitionBy("row_id").orderBy(F.col("createdon").desc())
-                    ))
-                )
-            else:  
-                #failrow. Keep the newest to prevent duplicates in onward processing, but include an error
-                matched_df = (
-                    matched_df
-                    .withColumn("row_num", F.row_number().over(
-                        W.partitionBy("row_id").orderBy(F.col("createdon").desc())
-                    ))
-                )
-                # Get one error per row_id
-                errors_df = matched_df.where("row_num == 2")
-                errors_df = errors_df.withColumn("error_message", F.lit(multiple_match_entity_error))
-                for row in errors_df.collect():
-                    self._log_failed_rows(errors_df, validation, rule_name, "matching")
-                        
-            # Dedupe just selecting the oldest, newest, or any row as required
-            matched_df = matched_df.where("row_num == 1").drop("row_num")
+        if key_columns:
+            matched_df = source_data_df.join(entity_df, on=key_columns, how="left")
+        else:
+            matched_df = source_data_df.join(entity_df, on=F.lit(True), how="left")
 
-        matched_df = matched_df.drop("createdon")
+        # Found none behaviour.
+        # Since the join returns null in the columns if no match is found,
+        # there is no additional action required for return null
+        error_structs = []
+        if found_none_behaviour == "fail_row":
+            # A row is unmatched if all the output columns are null and the source columns hold a value
+            no_match_expr = None
+            for expression in [F.col(output.get("output")).isNull() for output in output_columns] + [F.col(col).isNotNull() for col in source_key_columns]:
+                no_match_expr = expression if no_match_expr is None else no_match_expr & expression
+
+            condition_expr = self._filter_conditions_to_expr(conditions)
+            if condition_expr is not None:
+                no_match_expr = no_match_expr & condition_expr
+
+            error_structs.append(F.when(no_match_expr, F.struct(
+                F.lit(0).alias("check_index"),
+                F.lit(rule_name).alias("rule_name"),
+                F.lit(validation).alias("validation"),
+                F.lit(no_match_entity_error).alias("error_message")
+            )))
+
+        if found_multiple_behaviour == "fail_row":
+            error_structs.append(F.when(F.col("_match_count") > 1, F.struct(
+                F.lit(1).alias("check_index"),
+                F.lit(rule_name).alias("rule_name"),
+                F.lit(validation).alias("validation"),
+                F.lit(multiple_match_entity_error).alias("error_message")
+            )))
+
+        if error_structs:
+            failed_rows_df = (
+                matched_df
+                .select("datasource", "entity_name", "row_id",
+                        F.filter(F.array(*error_structs), lambda error: error.isNotNull()).alias("errors"))
+                .where(F.size("errors") > 0)
+                .select("datasource", "entity_name", "row_id", F.explode("errors").alias("error"))
+                .select("datasource", "entity_name", "row_id", "error.*")
+            )
+            self._log_compiled_errors(failed_rows_df=failed_rows_df, validation_stage="matching")
+
+        matched_df = matched_df.drop(*key_columns, "_match_count")
 
 
         return matched_df
@@ -297,11 +267,9 @@
             else f"LOWER(shl_datasourcedetail) == '{data_source_detail.lower()}'"
         )
 
-        py3_ext_reference_df = (
-            self._spark.table(f"{self.environment}_py3_externalreference")
-            .select("py3_externalreference", "regardingobjectid", "regardingobjectid_entitytype", "shl_datasource", "shl_datasourcedetail", "py3_externalreference")
-            .where(filter_condition)
-        )
+        py3_ext_reference_df = self._get_lookup_table(f"{self.environment}_py3_externalreference",
+                                                      columns=["py3_externalreference", "regardingobjectid", "regardingobjectid_entitytype", "shl_datasource", "shl_datasourcedetail"],
+                                                      filter_condition=filter_condition)
 
         # Join the spark data frame with the source data on the data_source_column, data_source_detail, and ext_reference_column values to get the regardingobjectid_entity column
         join_condition = (
@@ -316,34 +284,37 @@
             .join(py3_ext_reference_df.alias("ext"), join_condition, how="left")
         )
 
-        # Extract distinct table names from the regardingobjectid_entitytype column
-        table_names_df = extref_df.select("regardingobjectid_entitytype").distinct()
-        table_names = [row["regardingobjectid_entitytype"] for row in table_names_df.collect()]
-
-        # Iterate over each table name and perform the join
-        for table_name in table_names:
-            
-            if table_name:
-                # Load the table based on the table name
-                entity_df = self._spark.table(f"{self.environment}_{table_name}").select("Id", "statecode")
-
-                # Perform the join
-                extref_df = (
-                    extref_df
-                    .alias("match")
-                    .join(entity_df.alias("ent"), 
-                        (F.col("match.regardingobjectid") == F.col("ent.Id")) & 
-                        (F.col("ent.statecode") == 0), 
-                        how="left")
-                    .drop("statecode")
-                )
-        extref_df = extref_df.withColumn(f"{output_column}", F.col("Id")).drop("Id")
+        # Extract distinct table names from the cached external reference lookup rather than the joined source data
+        table_names_df = py3_ext_reference_df.select("regardingobjectid_entitytype").distinct()
+        table_names = [row["regardingobjectid_entitytype"] for row in self._collect(table_names_df) if row["regardingobjectid_entitytype"]]
+
+        if table_names:
+            # Build one compact union of the active record ids of every target table
+            active_ids_df = functools.reduce(DataFrame.unionByName, [
+                self._get_lookup_table(f"{self.environment}_{table_name}", columns=["Id"], filter_condition="statecode = 0")
+                .select(F.lit(table_name).alias("target_entitytype"), F.col("Id"))
+                for table_name in table_names
+            ])
+            active_ids_df = self._broadcast_if_small(active_ids_df)
+
+            # Resolve every reference with a single join on the entity type and id
+            extref_df = (
+                extref_df
+                .join(active_ids_df,
+                      (F.col("regardingobjectid_entitytype") == F.col("target_entitytype")) &
+                      (F.col("regardingobjectid") == F.col("Id")),
+                      how="left")
+                .drop("target_entitytype")
+            )
+            extref_df = extref_df.withColumn(f"{output_column}", F.col("Id")).drop("Id")
+        else:
+            extref_df = extref_df.withColumn(f"{output_column}", F.lit(None).cast(StringType()))
 
         
         if behaviour == 'fail_row':
             errors_df = extref_df.where(F.col(f"{output_column}").isNull())
             errors_df = errors_df.withColumn("error_message", F.lit(ext_ref_error_message))
-            self._log_failed_rows(errors_df, validation, rule_name, "matching", ext_ref_error_message)
+            self._log_failed_rows(errors_df, validation, rule_name, "matching")
         
         # Drop other unused columns
         columns_to_drop = ["shl_datasource","shl_datasourcedetail","py3_externalreference","regardingobjectid","regardingobjectid_entitytype"]
@@ -0,0 +1,281 @@
+"""Benchmarks the DataQualityLibrary entry points against synthetic feeds on a local SparkSession.
+
+For each row count a feed is generated from the sample metadata with synthetic_feed.generate_feed, written to
+CSV and read back, so the entry points run against the same kind of DataFrame as a pipeline does. Each public
+entry point is then run once per repeat, and every _expect_* and _match_to_* helper which it calls is timed
+separately. Each result records the wall time, the Spark jobs and stages started, the rows logged as errors,
+the peak JVM heap used while it ran and the high-water mark of the Python driver process. DataFrames returned
+by row_processing and custom_validation are written to the noop sink, so the time includes evaluating them.
+
+The session runs on the loopback interface with the Spark UI disabled, so no network access is needed. Results
+are written as JSON for comparing builds.
+
+Example usage:
+    python benchmarks/run_benchmarks.py --rows 10000 1000000 --columns 80 --error-rate 0.05 --null-rate 0.02
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from pyspark.sql import SparkSession
+
+from synthetic_feed import file_validation_rules, generate_feed, load_sample_metadata
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HELPER_PREFIXES = ("_expect_", "_match_to_")
+
+
+def load_library(notebook_path: str = os.path.join(REPO_PATH, "DataQuality.ipynb")) -> dict:
+    """Runs the code cells of the DataQuality notebook and returns the names they define."""
+    with open(notebook_path, encoding="utf-8") as notebook_file:
+        notebook = json.load(notebook_file)
+
+    namespace = {"__name__": "data_quality"}
+    for cell in notebook["cells"]:
+        if cell["cell_type"] == "code":
+            exec(compile("".join(cell["source"]), notebook_path, "exec"), namespace)
+
+    return namespace
+
+
+def create_spark_session(master: str, shuffle_partitions: int) -> SparkSession:
+    """Returns a local SparkSession bound to the loopback interface with the UI disabled."""
+    return (
+        SparkSession.builder
+        .master(master)
+        .appName("data-quality-benchmarks")
+        .config("spark.driver.host", "127.0.0.1")
+        .config("spark.driver.bindAddress", "127.0.0.1")
+        .config("spark.ui.enabled", "false")
+        .config("spark.ui.retainedJobs", "100000")
+        .config("spark.ui.retainedStages", "100000")
+        .config("spark.sql.shuffle.partitions", str(shuffle_partitions))
+        .getOrCreate()
+    )
+
+
+class BenchmarkRecorder:
+    """Times code blocks and counts the Spark jobs and stages each one starts.
+
+    Every measured block runs in its own Spark job group. Blocks may be nested, for example a helper called
+    by an entry point; jobs started by a nested block are counted for both the nested block and the block
+    around it, and the job group of the outer block is restored when the nested block ends.
+    """
+    def __init__(self, spark) -> None:
+        self._spark = spark
+        self._sc = spark.sparkContext
+        self._frames = []
+        self._helper_totals = {}
+
+    def _jvm_heap_pools(self) -> list:
+        management = self._spark._jvm.java.lang.management.ManagementFactory
+        return [pool for pool in management.getMemoryPoolMXBeans() if pool.getType().toString() == "Heap memory"]
+
+    def reset_peak_memory(self) -> None:
+        for pool in self._jvm_heap_pools():
+            pool.resetPeakUsage()
+
+    def peak_memory(self) -> dict:
+        jvm_peak = sum(pool.getPeakUsage().getUsed() for pool in self._jvm_heap_pools())
+        python_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        if sys.platform != "darwin":
+            python_peak *= 1024
+
+        return {"jvm_peak_heap_bytes": jvm_peak, "python_max_rss_bytes": python_peak}
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        """Measures the block and yields a dict which holds wall_seconds, jobs and stages once it ends."""
+        group_id = f"benchmark-{uuid.uuid4()}"
+        frame = {"group_id": group_id, "name": name, "jobs": 0, "stages": 0}
+        self._frames.append(frame)
+        self._sc.setJobGroup(group_id, name)
+        start = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            frame["wall_seconds"] = time.perf_counter() - start
+            self._frames.pop()
+            tracker = self._sc.statusTracker()
+            for job_id in tracker.getJobIdsForGroup(group_id):
+                job_info = tracker.getJobInfo(job_id)
+                frame["jobs"] += 1
+                frame["stages"] += len(job_info.stageIds) if job_info else 0
+
+            if self._frames:
+                parent = self._frames[-1]
+                parent["jobs"] += frame["jobs"]
+                parent["stages"] += frame["stages"]
+                self._sc.setJobGroup(parent["group_id"], parent["name"])
+            else:
+                self._sc.setLocalProperty("spark.jobGroup.id", None)
+                self._sc.setLocalProperty("spark.job.description", None)
+
+    def time_helpers(self, dq) -> None:
+        """Wraps every _expect_* and _match_to_* method of the library instance so each call is measured."""
+        for name in dir(dq):
+            if name.startswith(HELPER_PREFIXES) and callable(getattr(dq, name)):
+                setattr(dq, name, self._timed_helper(name, getattr(dq, name)))
+
+    def _timed_helper(self, name: str, method):
+        def wrapper(*args, **kwargs):
+            with self.measure(name) as frame:
+                result = method(*args, **kwargs)
+            totals = self._helper_totals.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "jobs": 0, "stages": 0})
+            totals["calls"] += 1
+            for key in ["wall_seconds", "jobs", "stages"]:
+                totals[key] += frame[key]
+            return result
+        return wrapper
+
+    def pop_helper_totals(self) -> dict:
+        """Returns the helper timings recorded since the last call, keyed by method name."""
+        helper_totals, self._helper_totals = self._helper_totals, {}
+        return helper_totals
+
+
+def _consume(result) -> None:
+    """Evaluates a returned DataFrame, or the DataFrame in a (bool, DataFrame) result, with the noop sink."""
+    if isinstance(result, tuple):
+        result = result[-1]
+    if hasattr(result, "write"):
+        result.write.format("noop").mode("overwrite").save()
+
+
+def _benchmark_cases(dq, source_df, metadata: dict, file_rules: dict, source_path: str) -> list:
+    """Returns (case name, callable) pairs for each entry point and mode of the library."""
+    field_rules = {"rules": metadata["field_validation"], "mandatory_columns": file_rules["mandatory_columns"]}
+    custom_rules = {"rules": metadata["custom_validation"]}
+    cases = [
+        ("file_validation", lambda: dq.file_validation(source_df, file_rules, source_path)),
+        ("field_validation", lambda: dq.field_validation(source_df, field_rules)),
+        ("field_validation[single_pass]", lambda: dq.field_validation(source_df, field_rules, single_pass=True)),
+        ("row_processing", lambda: dq.row_processing(source_df, metadata["row_processing"])),
+        ("row_processing[fused]", lambda: dq.row_processing(source_df, metadata["row_processing"], fused=True)),
+        ("custom_validation", lambda: dq.custom_validation(source_df, custom_rules)),
+    ]
+
+    return cases
+
+
+def run_benchmarks(spark, library: dict, args) -> list:
+    """Runs every benchmark case for each row count and backend and returns the result records."""
+    recorder = BenchmarkRecorder(spark)
+    metadata = load_sample_metadata(args.datasource)
+    results = []
+
+    for rows in args.rows:
+        feed_df = generate_feed(spark, metadata, rows=rows, columns=args.columns, error_rate=args.error_rate,
+                                null_rate=args.null_rate, partitions=args.partitions, seed=args.seed)
+        file_rules = file_validation_rules(feed_df, max_length=args.max_length)
+
+        for backend in args.backend:
+            feed_path = os.path.join(args.work_dir, f"feed_{rows}_{backend}")
+            writer_df = feed_df.coalesce(1) if backend == "local" else feed_df
+            writer_df.write.mode("overwrite").option("header", True).csv(feed_path)
+
+            if backend == "local":
+                dq = library["LocalDataQualityLibrary"](spark, run_id="benchmark", trigger_time=args.started_at)
+                source_path = next(os.path.join(feed_path, name) for name in sorted(os.listdir(feed_path))
+                                   if name.startswith("part-"))
+                source_df = dq.read_source_file(source_path)
+            else:
+                dq = library["DataQualityLibrary"](spark, run_id="benchmark", trigger_time=args.started_at)
+                source_path = feed_path
+                source_df = spark.read.option("header", True).csv(feed_path)
+            recorder.time_helpers(dq)
+
+            for repeat in range(args.repeat):
+                for case, run_case in _benchmark_cases(dq, source_df, metadata, file_rules, source_path):
+                    dq.reset_error_logs()
+                    recorder.pop_helper_totals()
+                    recorder.reset_peak_memory()
+                    with recorder.measure(case) as frame:
+                        result = run_case()
+                        _consume(result)
+
+                    record = {
+                        "backend": backend,
+                        "rows": rows,
+                        "columns": len(feed_df.columns),
+                        "repeat": repeat,
+                        "case": case,
+                        "method": case.split("[")[0],
+                        "kind": "entry_point",
+                        "calls": 1,
+                        "wall_seconds": frame["wall_seconds"],
+                        "jobs": frame["jobs"],
+                        "stages": frame["stages"],
+                        "errors_logged": len(dq._row_errors),
+                        **recorder.peak_memory(),
+                    }
+                    results.append(record)
+                    print(f"{backend:5} rows={rows:<10} {case:32} {frame['wall_seconds']:9.3f}s "
+                          f"jobs={frame['jobs']:<5} stages={frame['stages']:<5} errors={record['errors_logged']}")
+
+                    for method, totals in sorted(recorder.pop_helper_totals().items()):
+                        results.append({**record, "method": method, "kind": "helper", "errors_logged": None,
+                                        "jvm_peak_heap_bytes": None, **totals})
+
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_PATH, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the DataQualityLibrary on synthetic feeds.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="Row counts to benchmark.")
+    parser.add_argument("--columns", type=int, default=None, help="Total data columns, padded with filler columns.")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of values which fail their rule.")
+    parser.add_argument("--null-rate", type=float, default=0.02, help="Fraction of values which are null.")
+    parser.add_argument("--max-length", type=int, default=255, help="max_length for the field_length checks.")
+    parser.add_argument("--datasource", default=None, help="Only use sample metadata for this datasource.")
+    parser.add_argument("--backend", nargs="+", choices=["spark", "local"], default=["spark"])
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times each case is run.")
+    parser.add_argument("--partitions", type=int, default=None, help="Partitions of the generated feed.")
+    parser.add_argument("--shuffle-partitions", type=int, default=8)
+    parser.add_argument("--master", default="local[*]")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", default=None, help="Folder for the generated feeds. Default is a temporary folder.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to.")
+    args = parser.parse_args(argv)
+    args.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    library = load_library()
+    spark = create_spark_session(args.master, args.shuffle_partitions)
+    with tempfile.TemporaryDirectory(prefix="dq-benchmark-") as temp_dir:
+        args.work_dir = args.work_dir or temp_dir
+        results = run_benchmarks(spark, library, args)
+
+    report = {
+        "started_at": args.started_at,
+        "git_commit": _git_commit(),
+        "spark_version": spark.version,
+        "python_version": platform.python_version(),
+        "master": args.master,
+        "parameters": {key: value for key, value in vars(args).items() if key not in ["started_at", "work_dir"]},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Synthetic source feeds for benchmarking the DataQualityLibrary.
+
+The generator reads the rules in sample_metadata/field_validation, row_processing and custom_validation and
+builds a string typed DataFrame, as the CSV reader returns, containing every column the rules read. Values are
+valid for the rule which first references the column unless the row is chosen to be null or to be an error,
+so the error rate and null rate control how many rows each rule logs. Data is generated with spark.range and
+seeded rand columns, so no driver memory is used and the same seed always produces the same feed.
+
+Example usage:
+    metadata = load_sample_metadata("adventureworks")
+    feed_df = generate_feed(spark, metadata, rows=1000000, columns=80, error_rate=0.05, null_rate=0.02)
+"""
+import ast
+import os
+
+import pyspark.sql.functions as F
+from pyspark.sql import DataFrame
+
+SAMPLE_METADATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_metadata")
+SYSTEM_COLUMNS = ["datasource", "entity_name", "row_id"]
+RELATIVE_DATE_TYPES = ["today_or_earlier", "today_or_later"]
+VALID_POST_CODES = ["SW1A 1AA", "M1 1AE", "B33 8TH", "CR2 6XH", "DN55 1PT", "EC1A 1BB"]
+
+
+def load_sample_metadata(datasource: str = None, metadata_path: str = SAMPLE_METADATA_PATH) -> dict:
+    """Reads the sample metadata rules in the shape each DataQualityLibrary entry point expects.
+
+    Rules without a name are given one from their type and position, and expect_relative_date rules with a
+    time which is not today_or_earlier or today_or_later are set to today_or_earlier, so that every sample
+    rule runs its checks.
+
+    Args:
+        datasource (str, optional): Only return rules for this datasource. Default is all datasources.
+        metadata_path (str, optional): Folder containing the sample metadata files.
+
+    Returns:
+        metadata (dict): field_validation and custom_validation rule dictionaries, and the row_processing rule list.
+    """
+    metadata = {}
+    for section in ["field_validation", "row_processing", "custom_validation"]:
+        with open(os.path.join(metadata_path, section), encoding="utf-8") as metadata_file:
+            rules = ast.literal_eval(metadata_file.read())
+
+        if datasource:
+            rules = [rule for rule in rules if rule.get("datasource") == datasource]
+
+        for index, rule in enumerate(rules):
+            rule.setdefault("name", f"{rule['type']}_{index}")
+            if rule["type"] == "expect_relative_date" and rule.get("time") not in RELATIVE_DATE_TYPES:
+                rule["time"] = RELATIVE_DATE_TYPES[0]
+
+        metadata[section] = rules
+
+    return metadata
+
+
+def _column_specs(metadata: dict) -> dict:
+    """Returns the value specification for every source column read by the metadata rules.
+
+    Columns created by an earlier row_processing rule are not source columns and are skipped. The first rule
+    to reference a column decides the kind of values it holds.
+    """
+    specs = {}
+    created_columns = set()
+
+    def add(column, kind, **params):
+        if column and column not in specs and column not in created_columns:
+            specs[column] = dict(kind=kind, **params)
+
+    def add_conditions(conditions):
+        for condition in conditions or []:
+            add(condition.get("column"), "condition", value=condition.get("value"))
+
+    for rule in metadata.get("field_validation", []):
+        for column in rule.get("columns", []):
+            match rule["type"]:
+                case "expect_column_values_to_not_be_null" | "expect_at_least_one_non_null_column":
+                    add(column, "required")
+                case "expect_column_distinct_values_to_be_in_set":
+                    add(column, "set", values=rule.get("values"))
+                case "expect_column_values_to_be_between":
+                    add(column, "number", min_value=rule.get("min_value", 0), max_value=rule.get("max_value", 1000))
+                case "expect_column_values_to_be_null":
+                    add(column, "null_expected")
+                case "expect_relative_date":
+                    add(column, "date", format="dd/MM/yyyy", time=rule.get("time"))
+                case "expect_format":
+                    add(column, "length", length=rule.get("length", 10))
+                case _:
+                    add(column, "required")
+        add_conditions(rule.get("conditions"))
+
+    for rule in metadata.get("row_processing", []):
+        columns = rule.get("columns", [])
+        match rule["type"]:
+            case "format_date":
+                for column in columns:
+                    add(column, "date", format="dd/MM/yyyy" if rule.get("format") == "any" else rule.get("format"))
+            case "format_datetime":
+                for column in columns:
+                    add(column, "date", format="dd/MM/yyyy HH:mm:ss" if rule.get("format") == "any" else rule.get("format"))
+            case "format_email_address":
+                for column in columns:
+                    add(column, "email")
+            case "format_phone_number":
+                for column in columns:
+                    add(column, "phone")
+            case "format_post_code":
+                for column in columns:
+                    add(column, "post_code")
+            case "convert_values":
+                for column in columns:
+                    add(column, "set", values=[replace["from"] for replace in rule.get("replaces", [])])
+            case "remove_characters":
+                add(rule.get("column"), "characters", characters=rule.get("characters", []))
+            case "date_part":
+                add(rule.get("column"), "date", format="yyyy-MM-dd")
+            case "backdate_four_tax_years":
+                add(rule.get("date"), "date", format="yyyy-MM-dd")
+            case "copy_columns":
+                for copy_column in rule.get("copy_columns", []):
+                    add(copy_column.get("column"), "text")
+            case _:
+                for column in columns:
+                    add(column, "text")
+        add_conditions(rule.get("conditions"))
+        for if_then in rule.get("if_thens", []):
+            add_conditions(if_then.get("conditions"))
+
+        # Record the columns this rule creates so later rules read them rather than source columns.
+        suffix = rule.get("suffix")
+        if suffix:
+            created_columns.update(f"{column}{suffix}" for column in columns)
+        if rule.get("output"):
+            created_columns.add(rule["output"])
+        for copy_column in rule.get("copy_columns", []):
+            created_columns.add(copy_column.get("new_column_name"))
+
+    for rule in metadata.get("custom_validation", []):
+        match rule["type"]:
+            case "expect_column_values_to_be_unique_in_file":
+                # Values which are required elsewhere are also unique, so the duplicates take precedence.
+                if rule.get("column") in specs and specs[rule.get("column")]["kind"] == "required":
+                    specs.pop(rule.get("column"))
+                add(rule.get("column"), "unique")
+            case _:
+                for column in rule.get("columns", []):
+                    add(column, "required")
+        add_conditions(rule.get("conditions"))
+
+    for column in SYSTEM_COLUMNS:
+        specs.pop(column, None)
+
+    return specs
+
+
+def _value_exprs(column: str, spec: dict, row_id) -> tuple:
+    """Returns the (valid, invalid) value expressions for a column specification."""
+    kind = spec["kind"]
+    invalid = F.lit(f"INVALID_{column}")
+
+    match kind:
+        case "set":
+            values = spec.get("values") or ["A"]
+            valid = F.element_at(F.array(*[F.lit(value) for value in values]), (row_id % len(values) + 1).cast("int"))
+        case "number":
+            min_value, max_value = spec["min_value"], spec["max_value"]
+            valid = (F.lit(min_value + 1) + row_id % max(max_value - min_value - 1, 1)).cast("string")
+            invalid = F.lit(str(min_value - 1))
+        case "null_expected":
+            valid = F.lit(None).cast("string")
+            invalid = F.concat(F.lit("EXISTING_"), row_id.cast("string"))
+        case "date":
+            days = (row_id % 3650).cast("int")
+            valid = F.date_format(F.date_sub(F.current_date(), days), spec["format"])
+            if spec.get("time") == "today_or_later":
+                valid = F.date_format(F.date_add(F.current_date(), days), spec["format"])
+            elif spec.get("time") == "today_or_earlier":
+                invalid = F.date_format(F.date_add(F.current_date(), days + 1), spec["format"])
+        case "email":
+            valid = F.concat(F.lit(" User."), row_id.cast("string"), F.lit("@Example.com "))
+        case "phone":
+            valid = F.concat(F.lit("07"), F.lpad((row_id % 1000000000).cast("string"), 9, "0"))
+        case "post_code":
+            valid = F.element_at(F.array(*[F.lit(value) for value in VALID_POST_CODES]), (row_id % len(VALID_POST_CODES) + 1).cast("int"))
+        case "characters":
+            characters = spec.get("characters") or ["-"]
+            valid = F.concat_ws(characters[0], F.lit("12"), (row_id % 100).cast("string"), F.lit("56"))
+        case "unique":
+            valid = F.concat(F.lit("ID"), row_id.cast("string"))
+            invalid = F.lit("ID_DUPLICATE")
+        case "condition":
+            valid = F.when(row_id % 2 == 0, F.lit(spec.get("value"))).otherwise(F.lit("Other"))
+        case "length":
+            valid = F.lpad((row_id % 1000).cast("string"), spec["length"], "0")
+            invalid = F.lpad((row_id % 1000).cast("string"), spec["length"] + 1, "0")
+        case "required":
+            valid = F.concat(F.lit(f"{column}_"), row_id.cast("string"))
+            invalid = F.lit(None).cast("string")
+        case _:
+            valid = F.concat(F.lit(f"{column}_"), (row_id % 1000).cast("string"))
+            invalid = valid
+
+    return valid, invalid
+
+
+def generate_feed(spark, metadata: dict, rows: int, columns: int = None, error_rate: float = 0.05,
+                  null_rate: float = 0.0, datasource: str = "benchmark", entity_name: str = "benchmark",
+                  partitions: int = None, seed: int = 42) -> DataFrame:
+    """Generates a synthetic source DataFrame for the metadata rules.
+
+    Every row draws a random number per column. Rows below null_rate hold a null, rows below
+    null_rate + error_rate hold a value which fails the rule for that column and the rest hold valid values.
+    Columns which only hold free text cannot fail, and are only affected by the null rate.
+
+    Args:
+        spark: The active SparkSession.
+        metadata (dict): Rules returned by load_sample_metadata.
+        rows (int): Number of rows to generate.
+        columns (int, optional): Total number of data columns. Filler text columns are added when this is
+                                 more than the number of columns read by the rules. Default is the rule columns only.
+        error_rate (float, optional): Fraction of values in each column which fail their rule. Default is 0.05.
+        null_rate (float, optional): Fraction of values in each column which are null. Default is 0.0.
+        datasource (str, optional): Value of the datasource column.
+        entity_name (str, optional): Value of the entity_name column.
+        partitions (int, optional): Number of partitions. Default is spark.default.parallelism.
+        seed (int, optional): Seed for the random values. Default is 42.
+
+    Returns:
+        feed_df (DataFrame): datasource, entity_name and row_id followed by the data columns, all strings.
+    """
+    specs = _column_specs(metadata)
+    for index in range(len(specs), columns or 0):
+        specs[f"filler_{index}"] = {"kind": "text"}
+
+    range_df = spark.range(0, rows, numPartitions=partitions or spark.sparkContext.defaultParallelism)
+    random_columns = [F.rand(seed + index).alias(f"_rand_{index}") for index in range(len(specs))]
+    range_df = range_df.select("id", *random_columns)
+
+    row_id = F.col("id")
+    feed_columns = [F.lit(datasource).alias("datasource"),
+                    F.lit(entity_name).alias("entity_name"),
+                    row_id.cast("string").alias("row_id")]
+    for index, (column, spec) in enumerate(specs.items()):
+        draw = F.col(f"_rand_{index}")
+        valid, invalid = _value_exprs(column, spec, row_id)
+        feed_columns.append(
+            F.when(draw < null_rate, F.lit(None).cast("string"))
+            .when(draw < null_rate + error_rate, invalid.cast("string"))
+            .otherwise(valid.cast("string"))
+            .alias(column)
+        )
+
+    return range_df.select(*feed_columns)
+
+
+def file_validation_rules(feed_df: DataFrame, max_length: int = None) -> dict:
+    """Returns file_validation metadata listing every column of the feed as mandatory.
+
+    Args:
+        feed_df (DataFrame): Feed returned by generate_feed.
+        max_length (int, optional): max_length for each data column, which adds the field_length checks
+                                    to field_validation. Default is no length checks.
+
+    Returns:
+        metadata_rules (dict): Dictionary with a mandatory_columns list.
+    """
+    mandatory_columns = []
+    for column in feed_df.columns:
+        item = {"name": column}
+        if max_length and column not in SYSTEM_COLUMNS:
+            item["max_length"] = max_length
+        mandatory_columns.append(item)
+
+    return {"mandatory_columns": mandatory_columns}
@@ -0,0 +1,64 @@
+"""Shared fixtures for the DataQualityLibrary tests.
+
+The library is defined in the code cells of DataQuality.ipynb, which are run into a namespace once per session.
+Tests which need Spark use a local SparkSession bound to the loopback interface with the UI disabled.
+"""
+import importlib.util
+import json
+import os
+
+import pytest
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_library(notebook_path: str = os.path.join(REPO_PATH, "DataQuality.ipynb")) -> dict:
+    """Runs the code cells of the DataQuality notebook and returns the names they define."""
+    with open(notebook_path, encoding="utf-8") as notebook_file:
+        notebook = json.load(notebook_file)
+
+    namespace = {"__name__": "data_quality"}
+    for cell in notebook["cells"]:
+        if cell["cell_type"] == "code":
+            exec(compile("".join(cell["source"]), notebook_path, "exec"), namespace)
+
+    return namespace
+
+
+def load_synthetic_feed():
+    """Imports the synthetic feed generator, which builds source feeds for the sample metadata."""
+    spec = importlib.util.spec_from_file_location("synthetic_feed", os.path.join(REPO_PATH, "benchmarks", "synthetic_feed.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def create_spark_session(master: str = "local[2]", shuffle_partitions: int = 2):
+    """Returns a local SparkSession bound to the loopback interface with the UI disabled."""
+    from pyspark.sql import SparkSession
+
+    return (
+        SparkSession.builder
+        .master(master)
+        .appName("data-quality-tests")
+        .config("spark.driver.host", "127.0.0.1")
+        .config("spark.driver.bindAddress", "127.0.0.1")
+        .config("spark.ui.enabled", "false")
+        .config("spark.sql.shuffle.partitions", str(shuffle_partitions))
+        .getOrCreate()
+    )
+
+
+@pytest.fixture(scope="session")
+def spark():
+    pytest.importorskip("pyspark")
+    spark = create_spark_session()
+    yield spark
+    spark.stop()
+
+
+@pytest.fixture(scope="session")
+def library() -> dict:
+    pytest.importorskip("pyspark")
+    return load_library()
@@ -0,0 +1,33 @@
+"""Tests for how the entry points handle metadata which compile_metadata rejects or warns about.
+
+The tests use the local SparkSession of conftest.py, so they need pyspark and a Java runtime, and are skipped
+when pyspark is not installed.
+
+Example usage:
+    python -m pytest tests/test_compile_metadata.py
+"""
+import pytest
+
+pytest.importorskip("pyspark")
+
+
+def test_raw_metadata_warns_and_plan_is_strict(library):
+    field_rules = {"mandatory_columns": [], "rules": [
+        {"type": "expect_relative_date", "name": "relative_date", "columns": ["date_of_registration"],
+         "time": "registration_date_as_date", "comment": "not a rule parameter"}]}
+
+    plan = library["compile_metadata"](field_validation=field_rules, strict=False)
+    assert plan.field_validation.rules[0]["time"] == "registration_date_as_date"
+
+    with pytest.raises(library["MetadataRuleError"]) as error:
+        library["compile_metadata"](field_validation=field_rules)
+    assert len(error.value.problems) == 2
+
+
+def test_invalid_metadata_is_raised_by_entry_points(spark, library):
+    source_df = spark.createDataFrame([("1", "a")], ["row_id", "name"])
+    field_rules = {"mandatory_columns": [], "rules": [{"type": "expect_column_values_to_not_be_null", "name": "no_columns"}]}
+
+    dq = library["DataQualityLibrary"](spark, run_id="metadata", trigger_time="metadata")
+    with pytest.raises(library["MetadataRuleError"], match="missing required parameter 'columns'"):
+        dq.field_validation(source_df, field_rules)
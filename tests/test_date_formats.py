@@ -0,0 +1,32 @@
+"""Tests that row_processing only infers the formats of date columns with a format of any under the CORRECTED parser.
+
+The tests use the local SparkSession of conftest.py, so they need pyspark and a Java runtime, and are skipped
+when pyspark is not installed.
+
+Example usage:
+    python -m pytest tests/test_date_formats.py
+"""
+import pytest
+
+pytest.importorskip("pyspark")
+
+ROW_RULES = [{"type": "format_date", "name": "registration_date", "columns": ["registered"], "suffix": "_as_date", "format": "any"}]
+
+
+@pytest.mark.parametrize("time_parser_policy", ["CORRECTED", "LEGACY"])
+def test_formats_are_detected_under_corrected_policy(spark, library, time_parser_policy):
+    source_df = spark.createDataFrame([("1", "25/12/2024"), ("2", "2024-12-26 10:30:00"), ("3", "not a date")], ["row_id", "registered"])
+    source_df = source_df.selectExpr("'feed' AS datasource", "'people' AS entity_name", "*")
+    previous_policy = spark.conf.get("spark.sql.legacy.timeParserPolicy")
+    spark.conf.set("spark.sql.legacy.timeParserPolicy", time_parser_policy)
+    try:
+        dq = library["DataQualityLibrary"](spark, run_id="dates", trigger_time="dates")
+        processed_df = dq.row_processing(source_df, ROW_RULES)
+        parsed = {row.row_id: str(row.registered_as_date) for row in processed_df.collect()}
+    finally:
+        spark.conf.set("spark.sql.legacy.timeParserPolicy", previous_policy)
+
+    assert parsed == {"1": "2024-12-25", "2": "2024-12-26", "3": "None"}
+    assert [row_error["row_id"] for row_error in dq._row_errors] == ["3"]
+    assert bool(dq._date_formats) == (time_parser_policy == "CORRECTED")
+    assert [method_call["method"] for method_call in dq._method_calls] == ["row_processing"]
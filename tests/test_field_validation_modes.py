@@ -0,0 +1,39 @@
+"""Tests that field_validation logs the same row_errors with one Spark job per rule and with single_pass.
+
+The feeds for the sample metadata are generated with benchmarks/synthetic_feed.py. The tests use the local
+SparkSession of conftest.py, so they need pyspark and a Java runtime, and are skipped when pyspark is not installed.
+
+Example usage:
+    python -m pytest tests/test_field_validation_modes.py
+"""
+import pytest
+
+from conftest import load_synthetic_feed
+
+pytest.importorskip("pyspark")
+
+synthetic_feed = load_synthetic_feed()
+
+ROW_ERROR_KEYS = ["datasource", "entity_name", "row_id", "validation", "rule_name", "error_message", "stage"]
+
+
+@pytest.mark.parametrize("datasource", ["adventureworks", "www_importers"])
+def test_single_pass_matches_per_rule(spark, library, tmp_path, datasource):
+    metadata = synthetic_feed.load_sample_metadata(datasource)
+    feed_df = synthetic_feed.generate_feed(spark, metadata, rows=200, error_rate=0.2, null_rate=0.1,
+                                           datasource=datasource, partitions=2, seed=11)
+    # Read the feed back from CSV, as a pipeline does, rather than validating the generated plan
+    feed_df.write.option("header", True).csv(str(tmp_path / "feed"))
+    feed_df = spark.read.option("header", True).csv(str(tmp_path / "feed"))
+    file_rules = synthetic_feed.file_validation_rules(feed_df, max_length=12)
+    field_rules = {"rules": metadata["field_validation"], "mandatory_columns": file_rules["mandatory_columns"]}
+
+    row_errors = {}
+    for single_pass in [False, True]:
+        dq = library["DataQualityLibrary"](spark, run_id="modes", trigger_time="modes")
+        dq.field_validation(feed_df, field_rules, single_pass=single_pass)
+        row_errors[single_pass] = sorted((tuple(row_error.get(key) for key in ROW_ERROR_KEYS) for row_error in dq._row_errors), key=str)
+
+    logged_rules = {row_error[4] for row_error in row_errors[False]}
+    assert {rule["name"] for rule in metadata["field_validation"] if rule["type"] == "expect_column_values_to_be_null"} <= logged_rules
+    assert row_errors[True] == row_errors[False]
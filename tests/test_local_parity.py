@@ -0,0 +1,146 @@
+"""Parity tests between the pandas LocalDataQualityLibrary and the Spark DataQualityLibrary.
+
+Each test runs the same metadata through both backends, which read the same CSV file, and checks that they log
+the same row_errors and method_calls and return the same rows. The feeds for the sample metadata are generated
+with benchmarks/synthetic_feed.py. The tests use the local SparkSession of conftest.py, so they need pyspark,
+pandas and a Java runtime, and are skipped when pyspark or pandas are not installed.
+
+Example usage:
+    python -m pytest tests/test_local_parity.py
+"""
+import os
+
+import pytest
+
+from conftest import load_synthetic_feed
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyspark")
+
+synthetic_feed = load_synthetic_feed()
+
+ROW_ERROR_KEYS = ["datasource", "entity_name", "row_id", "validation", "rule_name", "error_message", "stage"]
+
+
+def _backends(spark, library: dict, source_path: str) -> dict:
+    """Returns the Spark and local backends, each with the source file read as that backend reads it, and the local
+    backend chosen by create_data_quality_library, which is passed the Spark DataFrame as existing callers do."""
+    spark_dq = library["DataQualityLibrary"](spark, run_id="parity", trigger_time="parity")
+    local_dq = library["LocalDataQualityLibrary"](spark, run_id="parity", trigger_time="parity")
+    factory_dq = library["create_data_quality_library"](spark, run_id="parity", trigger_time="parity", source_filepath=source_path)
+    assert isinstance(factory_dq, library["LocalDataQualityLibrary"])
+
+    return {
+        "spark": (spark_dq, spark.read.option("header", True).csv(source_path)),
+        "local": (local_dq, local_dq.read_source_file(source_path)),
+        "factory": (factory_dq, spark.read.option("header", True).csv(source_path)),
+    }
+
+
+def _write_feed(spark, feed_df, folder: str) -> str:
+    """Writes a Spark DataFrame to a single headered CSV file and returns its path."""
+    feed_df.coalesce(1).write.mode("overwrite").option("header", True).csv(folder)
+
+    return next(os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.startswith("part-"))
+
+
+def _rows(data_df, ignore_columns: set = frozenset()) -> list[dict]:
+    """Returns the rows of a Spark or pandas DataFrame as dictionaries ordered by row_id."""
+    if isinstance(data_df, pd.DataFrame):
+        rows = data_df.to_dict("records")
+    else:
+        rows = [row.asDict() for row in data_df.collect()]
+
+    rows = [{column: value for column, value in row.items() if column not in ignore_columns} for row in rows]
+
+    return sorted(rows, key=lambda row: row["row_id"])
+
+
+def _logs(dq) -> dict:
+    """Returns the row_errors in a stable order and the stage, method and status of each method_call."""
+    return {
+        "row_errors": sorted((tuple(row_error.get(key) for key in ROW_ERROR_KEYS) for row_error in dq._row_errors), key=str),
+        "method_calls": [(method_call["stage"], method_call["method"], method_call["status"]) for method_call in dq._method_calls],
+    }
+
+
+@pytest.mark.parametrize("datasource", ["adventureworks", "www_importers"])
+def test_sample_metadata_parity(spark, library, tmp_path, datasource):
+    metadata = synthetic_feed.load_sample_metadata(datasource)
+    feed_df = synthetic_feed.generate_feed(spark, metadata, rows=200, error_rate=0.2, null_rate=0.1, datasource=datasource,
+                            partitions=2, seed=7)
+    file_rules = synthetic_feed.file_validation_rules(feed_df, max_length=12)
+    source_path = _write_feed(spark, feed_df, str(tmp_path / "feed"))
+
+    field_rules = {"rules": metadata["field_validation"], "mandatory_columns": file_rules["mandatory_columns"]}
+    custom_rules = {"rules": metadata["custom_validation"]}
+    # GUIDs are random on both backends
+    guid_columns = {rule["output"] for rule in metadata["row_processing"]
+                    if rule["type"] == "create_field" and rule.get("function") == "create_guid"}
+
+    results = {}
+    for backend, (dq, source_df) in _backends(spark, library, source_path).items():
+        is_valid, source_df = dq.file_validation(source_df, file_rules, source_path)
+        dq.field_validation(source_df, field_rules)
+        processed_df = dq.row_processing(source_df, metadata["row_processing"])
+        is_file_valid, custom_df = dq.custom_validation(source_df, custom_rules)
+        # Only the local backend given a pandas DataFrame returns pandas DataFrames
+        assert isinstance(processed_df, pd.DataFrame) == isinstance(custom_df, pd.DataFrame) == (backend == "local")
+
+        results[backend] = {
+            "is_valid": is_valid,
+            "is_file_valid": is_file_valid,
+            "processed_rows": _rows(processed_df, guid_columns),
+            "custom_rows": _rows(custom_df),
+            **_logs(dq),
+        }
+
+    assert results["local"]["row_errors"], "the feed should fail some rules"
+    for backend in ["local", "factory"]:
+        for key in results["spark"]:
+            assert results[backend][key] == results["spark"][key], (backend, key)
+
+
+def test_comparison_coercion_parity(spark, library, tmp_path):
+    """Strings compared with numbers and booleans are cast as Spark casts them: 1e3 and values outside the int
+    range are not integers, fractions are truncated, and set values are compared as Spark formats them."""
+    values = ["1", " 7 ", "1.5", "1e3", "2147483648", "-3", "abc", None, "1.0", "true", "12"]
+    source_df = pd.DataFrame({
+        "datasource": "parity",
+        "entity_name": "coercion",
+        "row_id": [str(index) for index in range(len(values))],
+        "amount": values,
+        "flag": ["yes", "no", "t", "0", "maybe", None, "TRUE", "1", "f", "y", "n"],
+    })
+    source_path = str(tmp_path / "coercion.csv")
+    source_df.to_csv(source_path, index=False)
+
+    field_rules = {"rules": [
+        {"type": "expect_column_values_to_be_between", "name": "between_int", "columns": ["amount"],
+         "min_value": 0, "max_value": 10, "strict_min": True},
+        {"type": "expect_column_values_to_be_between", "name": "between_float", "columns": ["amount"],
+         "min_value": 0.5},
+        {"type": "expect_column_distinct_values_to_be_in_set", "name": "in_set_typed", "columns": ["amount"],
+         "values": [1, 1.0, 1e7, "abc"]},
+        {"type": "expect_column_distinct_values_to_be_in_set", "name": "in_set_null", "columns": ["amount"],
+         "values": ["1", None]},
+    ], "mandatory_columns": []}
+    custom_rules = {"rules": [
+        {"type": "expect_column_values", "name": "less_than", "action": "reject_row",
+         "conditions": [{"column": "amount", "comparison": "lt", "value": 5}]},
+        {"type": "expect_column_values", "name": "greater_than", "action": "reject_row",
+         "conditions": [{"column": "amount", "comparison": "gt", "value": 1.25}]},
+        {"type": "expect_column_values", "name": "equal_bool", "action": "reject_row",
+         "conditions": [{"column": "flag", "comparison": "eq", "value": True}]},
+        {"type": "expect_column_values", "name": "different_int", "action": "reject_row",
+         "conditions": [{"column": "amount", "comparison": "ne", "value": 1}]},
+    ]}
+
+    results = {}
+    for backend, (dq, data_df) in _backends(spark, library, source_path).items():
+        dq.field_validation(data_df, field_rules)
+        is_file_valid, _ = dq.custom_validation(data_df, custom_rules)
+        results[backend] = {"is_file_valid": is_file_valid, **_logs(dq)}
+
+    assert results["local"] == results["spark"]
+    assert results["factory"] == results["spark"]
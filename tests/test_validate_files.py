@@ -0,0 +1,39 @@
+"""Tests for the row_id and row counts validate_files gives files without a row_id column.
+
+The tests use the local SparkSession of conftest.py, so they need pyspark and a Java runtime, and are skipped
+when pyspark is not installed.
+
+Example usage:
+    python -m pytest tests/test_validate_files.py
+"""
+import pytest
+
+pytest.importorskip("pyspark")
+
+FILE_RULES = {"mandatory_columns": [{"name": "name"}, {"name": "email"}]}
+FIELD_RULES = {"mandatory_columns": [], "rules": [{"type": "expect_column_values_to_not_be_null", "name": "email_not_null", "columns": ["email"]}]}
+
+
+@pytest.mark.parametrize("materialise", [False, True])
+def test_generated_row_ids_follow_file_position(spark, library, tmp_path, materialise):
+    for file_name, rows in [("small.csv", 5), ("large.csv", 3000)]:
+        lines = [f"{file_name[:-4]}_{row},{'' if row % 7 == 0 else 'a@example.com'}\n" for row in range(rows)]
+        (tmp_path / file_name).write_text("name,email\n" + "".join(lines))
+
+    plan = library["compile_metadata"](file_validation=FILE_RULES, field_validation=FIELD_RULES)
+    policy = library["MaterialisationPolicy"](spark) if materialise else None
+    dq = library["DataQualityLibrary"](spark, run_id="files", trigger_time="files", materialisation_policy=policy)
+    # Small splits, so the large file is read by several tasks
+    spark.conf.set("spark.sql.files.maxPartitionBytes", "4096")
+    try:
+        valid_df, file_results = dq.validate_files(str(tmp_path / "*.csv"), plan, datasource="files", entity_name="people")
+        row_ids = {row.name: row.row_id for row in valid_df.collect()}
+    finally:
+        spark.conf.unset("spark.sql.files.maxPartitionBytes")
+        dq.release_cached_data()
+
+    # Files are ordered by path, so large.csv has the prefix 0
+    assert [(result["row_count"], result["error_count"]) for result in file_results] == [(3000, 429), (5, 1)]
+    assert row_ids["large_2999"] == "0:3000" and row_ids["small_4"] == "1:5"
+    assert len(set(row_ids.values())) == 3005
+    assert sorted(row_error["row_id"] for row_error in dq._row_errors)[:3] == ["0:1", "0:1002", "0:1009"]